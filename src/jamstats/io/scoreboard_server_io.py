@@ -3,9 +3,18 @@ import json
 import logging
 import traceback
 import ssl
+import threading
 import time
 from pprint import pprint
 
+try:
+    # orjson parses the scoreboard's (large) state messages several times faster
+    # than the standard library.
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,9 +46,13 @@ class ScoreboardClient:
         # keep track of the game id so we can detect when a new game starts
         self.game_id = None
 
-        # indicator of whether the game state has changed since the last time
-        # we checked
-        self.game_state_dirty = False
+        # monotonically increasing counter, bumped every time the game state
+        # changes meaningfully. Consumers compare against the last version they
+        # loaded to decide whether to rebuild.
+        self.state_version = 0
+        # set once the first game state has arrived from the server, so that
+        # consumers can wait for it rather than polling
+        self.game_state_received_event = threading.Event()
 
         # list of listeners to update when game state changes
         self.game_state_listeners = []
@@ -94,7 +107,7 @@ class ScoreboardClient:
         """
         self.n_messages_received += 1
         try:
-            message_dict = json.loads(message)
+            message_dict = json_loads(message)
             # ignore clock updates
             #message_dict = {
             #    key: message_dict[key]
@@ -158,12 +171,14 @@ class ScoreboardClient:
                 else:
                     logger.debug("Replacing game_json_dict with message_dict")
                     self.game_json_dict = message_dict
+                self.game_state_received_event.set()
                 # determine whether there was a meaningful change to the game state
                 for key in message_game_state_dict:
                     if not key.startswith("ScoreBoard.CurrentGame.Clock") and key != "ScoreBoard.Version(release)":
-                        self.game_state_dirty = True
+                        self.state_version += 1
                         #pprint(message_dict, indent=4)
-                        logger.debug(f"Setting game state dirty because {key}. Updating listeners.")
+                        logger.debug(f"Bumping game state version to {self.state_version} "
+                                     f"because {key}. Updating listeners.")
                         for listener in self.game_state_listeners:
                             listener.on_game_state_changed()
                         break
@@ -5,7 +5,6 @@ from typing import Dict
 import seaborn as sns
 from jamstats.data.game_data import DerbyGame
 import logging
-from matplotlib import pyplot as plt
 import pandas as pd
 from jamstats.plots.plot_util import (
     make_team_color_palette,
@@ -47,7 +46,8 @@ class JammersByTeamPlot(DerbyPlot):
 
         team_color_palette = make_team_color_palette(derby_game)
 
-        f, axes = plt.subplots(1, 3)
+        f = Figure()
+        axes = f.subplots(1, 3)
         ax = axes[0]
         sns.barplot(x="team", y="jammers",
                     data=pd.DataFrame({
@@ -80,9 +80,9 @@ class JammersByTeamPlot(DerbyPlot):
 
         ax =axes[2]
         sns.scatterplot(x="n_jams", y="mean_jam_score", data=pdf_jammer_summary_1,
-                        label=derby_game.team_2_name, color=team_color_palette[0])
+                        label=derby_game.team_2_name, color=team_color_palette[0], ax=ax)
         sns.scatterplot(x="n_jams", y="mean_jam_score", data=pdf_jammer_summary_2,
-                        label=derby_game.team_2_name, color=team_color_palette[1])
+                        label=derby_game.team_2_name, color=team_color_palette[1], ax=ax)
         ax.set_title("Mean jam score vs.\n# jams per jammer")
         ax.set_ylabel("Mean jam score")
         ax.set_xlabel("# jams")
@@ -120,7 +120,8 @@ class PerJamDataOnePeriodPlot(DerbyPlot):
         logger.debug(f"Restricting to period {self.period}")
         pdf_jam_data_long = pdf_jam_data_long[pdf_jam_data_long.PeriodNumber == self.period]
 
-        f, (ax0, ax1) = plt.subplots(1, 2, gridspec_kw={'width_ratios': [1, 4]})
+        f = Figure()
+        ax0, ax1 = f.subplots(1, 2, gridspec_kw={'width_ratios': [1, 4]})
         
         teamname_number_map = {derby_game.team_1_name: 1, derby_game.team_2_name: 2}
         pdf_jam_data_long["team_number"] = [teamname_number_map[name] for name in pdf_jam_data_long.team]
@@ -212,7 +213,7 @@ class PerJamDataOnePeriodPlot(DerbyPlot):
                     sns.lineplot(x="x", y="y", data=pd.DataFrame({
                         "x": [0.23, scores[i] - 0.28],
                         "y": [y_val, y_val]
-                    }), color="#FFFFFF55", size=0.5)
+                    }), color="#FFFFFF55", size=0.5, ax=ax)
 
         ax.set_xlim((0, highscore))
         ax.set_ylim((n_period_jams - 0.5, -0.5))
@@ -281,7 +282,8 @@ class TimeToInitialPassPlot(DerbyPlot):
                                             for team in pdf_jams_with_lead["Team with Lead"]]
         pdf_jams_with_lead = pdf_jams_with_lead.sort_values("team_number")
         
-        f, axes = plt.subplots(1, 2)
+        f = Figure()
+        axes = f.subplots(1, 2)
 
         ax = axes[0]
         pdf_plot = pdf_jams_data_long.sort_values("team_number").rename(columns={
@@ -4,7 +4,6 @@ import pandas as pd
 from matplotlib.figure import Figure
 from typing import List
 import seaborn as sns
-from matplotlib import pyplot as plt
 from jamstats.data.game_data import DerbyGame
 import logging
 from jamstats.plots.plot_util import (
@@ -12,7 +11,6 @@ from jamstats.plots.plot_util import (
     wordwrap_x_labels
 )
 import matplotlib.patches as mpatches
-from matplotlib.pyplot import Figure
 from matplotlib import gridspec
 
 from jamstats.plots.plot_util import build_anonymizer_map, DerbyPlot
@@ -53,7 +51,8 @@ class JammerStatsPlotOneTeam(DerbyPlot):
         pdf_jammer_data = pdf_jammer_data.sort_values(["Jams", "Total Score"],
                                                       ascending=False)
 
-        f, (ax0, ax1, ax2, ax3, ax4) = plt.subplots(1, 5)
+        f = Figure()
+        ax0, ax1, ax2, ax3, ax4 = f.subplots(1, 5)
 
         # build a palette
         n_jammers = len(set(pdf_jammer_data.Jammer))
@@ -125,22 +124,23 @@ class CumScoreByJamPlot(DerbyPlot):
 
         team_color_palette = make_team_color_palette(derby_game)
 
-        f, ax = plt.subplots()
+        f = Figure()
+        ax = f.subplots()
         sns.lineplot(x="prd_jam", y="TotalScore",
                     data=pdf_jam_data_long[pdf_jam_data_long.team == derby_game.team_1_name],
                                             label=derby_game.team_1_name,
-                    estimator=None, color=team_color_palette[0])
+                    estimator=None, color=team_color_palette[0], ax=ax)
         sns.lineplot(x="prd_jam", y="TotalScore",
                     data=pdf_jam_data_long[pdf_jam_data_long.team == derby_game.team_2_name],
                                             label=derby_game.team_2_name,
-                    estimator=None, color=team_color_palette[1])
+                    estimator=None, color=team_color_palette[1], ax=ax)
 
         # determine break betwen periods, if any. Draw a line there.
         n_periods = len(set(derby_game.pdf_jams_data.PeriodNumber))
         if n_periods == 2:
             n_jams_period1 = sum(derby_game.pdf_jams_data.PeriodNumber == 1)
             sns.lineplot(x=[n_jams_period1 - 0.5, n_jams_period1 - 0.5],
-                        y=[0, max(pdf_jam_data_long.TotalScore)])
+                        y=[0, max(pdf_jam_data_long.TotalScore)], ax=ax)
 
         for tick in ax.get_xticklabels():
             tick.set_rotation(90)
@@ -184,7 +184,8 @@ class SimpleLeadSummaryPlot(DerbyPlot):
                                             for team in pdf_jams_with_lead["Team with Lead"]]
         pdf_jams_with_lead = pdf_jams_with_lead.sort_values("team_number")
         
-        f, ax = plt.subplots()
+        f = Figure()
+        ax = f.subplots()
 
         pdf_jams_with_lead["Lost"] = pdf_jams_with_lead.Lost_1 | pdf_jams_with_lead.Lost_2
         pdf_for_plot_all = pdf_jams_with_lead[
@@ -265,7 +266,8 @@ class PenaltyCountsPlotByTeam(DerbyPlot):
 
         penalties_inorder = sorted(list(set(pdf_penalty_counts.Penalty)))
         
-        f, ax = plt.subplots()
+        f = Figure()
+        ax = f.subplots()
 
         if len(pdf_penalty_counts) > 0:
             sns.barplot(y="Penalty", x="Count", data=pdf_penalty_counts,
@@ -413,7 +415,8 @@ class SkaterStatsPlotOneTeam(DerbyPlot):
             logger.warn(f"Failed to make skater penalty subplot:")
             logger.warn(traceback.format_exc())
 
-        f, dummy_axis = plt.subplots()
+        f = Figure()
+        dummy_axis = f.subplots()
         dummy_axis.set_xticks([])
         dummy_axis.set_yticks([])
         # create grid for different subplots
@@ -433,7 +436,7 @@ class SkaterStatsPlotOneTeam(DerbyPlot):
             ax = f.add_subplot(spec[1])
             pdf_penalty_plot.plot(kind="barh", stacked=True, ax=ax,
                 color=penalty_color_map)
-            plt.gca().invert_yaxis()
+            ax.invert_yaxis()
             ax.set_title(f"Penalties by skater")
             ax.set_ylabel("")
             ax.set_xlabel("Penalties")
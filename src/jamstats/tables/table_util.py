@@ -8,7 +8,6 @@ import pandas as pd
 from pandas.io.formats.style import Styler
 from jamstats.plots.plot_util import DerbyElement
 from matplotlib.figure import Figure
-from matplotlib import pyplot as plt
 
 logger = logging.Logger(__name__)
 
@@ -90,8 +89,8 @@ class DerbyTable(DerbyHTMLElement):
             derby_game (DerbyGame): Derby Game
         """
         pdf_table = self.prepare_table_dataframe(derby_game)
-        f = plt.figure(figsize=(width, height))
-        ax = plt.subplot(111)
+        f = Figure(figsize=(width, height))
+        ax = f.add_subplot(111)
         ax.axis('off')
         ax.table(cellText=pdf_table.values,
                 colLabels=pdf_table.columns, bbox=[0,0,1,1])
@@ -0,0 +1,150 @@
+
+__author__ = "Damon May"
+
+from typing import Optional
+import hashlib
+import logging
+import os
+import sys
+import threading
+from jamstats.util.resources import get_jamstats_version
+
+logger = logging.Logger(__name__)
+
+# Rendered images are kept on disk, per jamstats version, so that restarting the server
+# or reloading the same game doesn't have to render everything again. Keys must
+# identify the image content (e.g., plot name + game state digest + render settings).
+
+# maximum total size of the cache directory. When it's exceeded, the least recently
+# used files are deleted.
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+# check the size of the cache directory after this many bytes have been written
+SWEEP_EVERY_BYTES = 10 * 1024 * 1024
+
+_cache_dir = None
+_bytes_since_sweep = 0
+_sweep_lock = threading.Lock()
+
+
+def get_render_cache_dir() -> Optional[str]:
+    """Get the directory for this jamstats version's render cache, creating it if needed.
+
+    Returns:
+        Optional[str]: path, or None if it can't be created
+    """
+    global _cache_dir
+    if _cache_dir is None:
+        if sys.platform == "win32":
+            base_dir = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")),
+                                    "jamstats", "Cache")
+        elif sys.platform == "darwin":
+            base_dir = os.path.join(os.path.expanduser("~/Library/Caches"), "jamstats")
+        else:
+            base_dir = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                                    "jamstats")
+        cache_dir = os.path.join(base_dir, get_jamstats_version())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Can't create render cache directory {cache_dir}: {e}")
+            # don't try again
+            cache_dir = ""
+        _cache_dir = cache_dir
+    return _cache_dir or None
+
+
+def get_render_cache_path(key: str, extension: str) -> Optional[str]:
+    """Get the path of the file for a cache key.
+
+    Args:
+        key (str): cache key
+        extension (str): file extension, e.g., "png"
+
+    Returns:
+        Optional[str]: path, or None if there's no cache directory
+    """
+    cache_dir = get_render_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest() + "." + extension)
+
+
+def read_cached_render(key: str, extension: str) -> Optional[bytes]:
+    """Read a rendered image from the disk cache.
+
+    Args:
+        key (str): cache key
+        extension (str): file extension, e.g., "png"
+
+    Returns:
+        Optional[bytes]: the image, or None if it isn't cached
+    """
+    path = get_render_cache_path(key, extension)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            contents = f.read()
+        # mark it recently used, for sweep_render_cache
+        os.utime(path)
+        return contents
+    except OSError:
+        return None
+
+
+def write_cached_render(key: str, extension: str, contents: bytes) -> None:
+    """Write a rendered image to the disk cache. Failures are logged and ignored.
+
+    Args:
+        key (str): cache key
+        extension (str): file extension, e.g., "png"
+        contents (bytes): the image
+    """
+    global _bytes_since_sweep
+    path = get_render_cache_path(key, extension)
+    if path is None:
+        return
+    # write to a temporary file and move it into place, so that readers never see
+    # a partial file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Failed to write render cache file {path}: {e}")
+        return
+    with _sweep_lock:
+        _bytes_since_sweep += len(contents)
+        should_sweep = _bytes_since_sweep >= SWEEP_EVERY_BYTES
+        if should_sweep:
+            _bytes_since_sweep = 0
+    if should_sweep:
+        sweep_render_cache()
+
+
+def sweep_render_cache() -> None:
+    """Delete the least recently used files in the cache directory until it's no larger
+    than MAX_CACHE_BYTES.
+    """
+    cache_dir = get_render_cache_dir()
+    if cache_dir is None:
+        return
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.is_file()]
+        stats = [(entry.path, entry.stat()) for entry in entries]
+    except OSError as e:
+        logger.debug(f"Failed to scan render cache directory {cache_dir}: {e}")
+        return
+    total_bytes = sum(stat.st_size for _, stat in stats)
+    if total_bytes <= MAX_CACHE_BYTES:
+        return
+    for path, stat in sorted(stats, key=lambda path_stat: path_stat[1].st_mtime):
+        try:
+            os.remove(path)
+            total_bytes -= stat.st_size
+        except OSError:
+            pass
+        if total_bytes <= MAX_CACHE_BYTES:
+            break
+    logger.debug(f"Swept render cache down to {total_bytes} bytes")
@@ -3,7 +3,7 @@ __author__ = "Damon May"
 
 from typing import Any
 import logging
-from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 from importlib import resources as importlib_resources
 import sys, os
 import io
@@ -24,10 +24,11 @@ def get_jamstats_logo_image() -> bytes:
         return get_resource("jamstats_logo.png")
     except Exception as e:
         logger.info(f"Failed to load logo image from resources: {e}")
-        f, ax = plt.subplots()
+        f = Figure()
+        ax = f.subplots()
         ax.text(0.5, 0.5, "Jamstats", transform=ax.transAxes, ha="center", size=80)
         img_buf = io.BytesIO()
-        plt.savefig(img_buf, format='png')
+        f.savefig(img_buf, format='png')
         resource_file_dict["jamstats_logo.png"] = img_buf.getvalue()
         return resource_file_dict["jamstats_logo.png"]
 
@@ -1,7 +1,9 @@
 __author__ = "Damon May"
 
+import hashlib
 import json
-from flask import (Flask, request, render_template_string, render_template, send_file)
+import re
+from flask import (Flask, Response, request, render_template, send_file)
 from jamstats.data.game_data import DerbyGame
 from jamstats.plots.plot_util import prepare_to_plot
 from jamstats.util.resources import (
@@ -9,10 +11,11 @@ from jamstats.util.resources import (
 )
 from jamstats.data.json_to_pandas import load_json_derby_game
 from jamstats.io.scoreboard_server_io import ScoreboardClient, GameStateListener
-import time
+from jamstats.util.render_cache import read_cached_render, write_cached_render
 import threading
 import traceback
-from engineio.async_drivers import gevent
+# imported explicitly so that pyinstaller bundles the async driver we use
+from engineio.async_drivers import threading as engineio_threading
 
 from jamstats.tables.jamstats_tables import (
     BothTeamsJammersTable,
@@ -41,7 +44,15 @@ from jamstats.plots.advanced_plots import (
 )
 
 import matplotlib
+from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
 from datetime import datetime
+from types import MappingProxyType
+from collections import namedtuple, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from markupsafe import escape
 import io
 import logging
 import socket
@@ -49,12 +60,34 @@ import sys, os
 from flask_socketio import SocketIO
 import jamstats
 
-#attempt to fix windows async issue. This did not work
-#from gevent import monkey
-#monkey.patch_all()
+try:
+    # orjson serializes the scoreboard's (large) game state several times faster than
+    # the standard library, straight to bytes.
+    import orjson
+
+    def json_dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+except ImportError:
+    def json_dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+        return json.dumps(obj, sort_keys=sort_keys, separators=(",", ":")).encode()
 
 GAME_STATE_UPDATE_MINSECS = 2
 
+# how long the first page request waits for game state from a new scoreboard connection
+SCOREBOARD_CONNECT_TIMEOUT_SECS = 5.0
+
+# Pillow PNG encoder settings for plots served to the browser. zlib level 1 encodes
+# several times faster than matplotlib's default for a slightly larger file.
+PNG_PIL_KWARGS = {"compress_level": 1, "optimize": False}
+
+# Pillow JPEG encoder settings. JPEG encodes faster and smaller than PNG, and the
+# artifacts don't matter for line and bar plots viewed in a browser.
+JPEG_PIL_KWARGS = {"quality": 85, "optimize": False}
+
+# largest size the page shows a plot at (see build_figure_html). Rendering more pixels
+# than this only for the browser to scale them down is wasted drawing and encoding.
+MAX_IMAGE_SIZE_PX = 1000
+
 logger = logging.Logger(__name__)
 
 def resource_path(relative_path):
@@ -69,9 +102,27 @@ logger.info(f"static_folder={static_folder}, template_folder={template_folder}")
 
 app = Flask(__name__.split('.')[0], static_url_path="", static_folder=static_folder,
             template_folder=template_folder)
+# Templates are compiled once and cached. Don't let debug mode turn on Jinja's
+# auto-reload, which re-checks template files on every render.
+app.config["TEMPLATES_AUTO_RELOAD"] = False
 app.socketio = None
 logger.info("Flask app built.")
 app.jamstats_plots = None
+# scoreboard client, and its state version, that app.derby_game was last built from.
+# Versions count from 0 for each client, so they're only comparable for the same client.
+# The lock makes sure only one loader rebuilds the game when the version moves.
+app._loaded_state_client = None
+app._loaded_state_version = -1
+app._derby_game_lock = threading.Lock()
+app.derby_game = None
+# digest of the game state the current game was built from. Cached elements are keyed on it.
+app.game_state_digest = None
+# (game, digest), replaced as a unit, for readers that need the two to match
+app.game_snapshot = (None, None)
+# digest of a game whose rendered images are worth keeping on disk, or None
+app.persisted_render_digest = None
+# message describing why the latest game state couldn't be loaded, or None
+app.game_load_error = None
 
 # This list of elements defines which elements will be shown in the UI.
 # It also defines the order in which elements are shown, but that's *not*
@@ -102,86 +153,135 @@ ELEMENTS_CLASSES = [
     JammersByTeamPlot,
 ]
 
+# Build the lookup tables below in a single pass over ELEMENTS_CLASSES.
+# They're read-only after import, so they're frozen.
+_element_name_class_map = {}
+_section_elementnames_map = {}
+_names_to_show_before_game_start = []
+for element_class in ELEMENTS_CLASSES:
+    _element_name_class_map[element_class.name] = element_class
+    _section_elementnames_map.setdefault(element_class.section, []).append(element_class.name)
+    if element_class.can_show_before_game_start:
+        _names_to_show_before_game_start.append(element_class.name)
+
 # map from element name to element class
-ELEMENT_NAME_CLASS_MAP = {element_class.name: element_class for element_class in ELEMENTS_CLASSES}
+ELEMENT_NAME_CLASS_MAP = MappingProxyType(_element_name_class_map)
 
 # which elements should be shown before the game starts?
-ELEMENT_NAMES_TO_SHOW_BEFORE_GAME_START = [
-    name for name in ELEMENT_NAME_CLASS_MAP
-     if ELEMENT_NAME_CLASS_MAP[name].can_show_before_game_start
-]
+ELEMENT_NAMES_TO_SHOW_BEFORE_GAME_START = frozenset(_names_to_show_before_game_start)
+# ...and the same, in display order
+ORDERED_ELEMENT_NAMES_TO_SHOW_BEFORE_GAME_START = tuple(_names_to_show_before_game_start)
 
 # map from section name to element names in the section
-SECTION_ELEMENTNAMES_MAP = {}
-for element_name, element_class in ELEMENT_NAME_CLASS_MAP.items():
-    section_name = element_class.section
-    if section_name not in SECTION_ELEMENTNAMES_MAP:
-        SECTION_ELEMENTNAMES_MAP[section_name] = []
-    SECTION_ELEMENTNAMES_MAP[section_name].append(element_name)
+SECTION_ELEMENTNAMES_MAP = MappingProxyType({
+    section_name: tuple(element_names)
+    for section_name, element_names in _section_elementnames_map.items()
+})
 
 # all element names
-ALL_ELEMENT_NAMES = list(ELEMENT_NAME_CLASS_MAP.keys())
+ALL_ELEMENT_NAMES = tuple(ELEMENT_NAME_CLASS_MAP)
+
+# how to build and serve each element as an image:
+# element_class: class that makes the figure
+# image_format: "jpeg" or "png"
+# mimetype: mimetype to serve the image with
+PlotSpec = namedtuple("PlotSpec", "element_class image_format mimetype")
+
+# Plots are served as JPEG. Elements that render as HTML (the tables) are only drawn
+# as images by the legacy /fig route, which serves them as PNG to keep their small text
+# lossless.
+PLOT_SPECS = MappingProxyType({
+    element_name: (PlotSpec(element_class, "png", "image/png")
+                   if element_class.can_render_html
+                   else PlotSpec(element_class, "jpeg", "image/jpeg"))
+    for element_name, element_class in ELEMENT_NAME_CLASS_MAP.items()
+})
+
+# maximum number of encoded plot images to keep. Room for every element at two
+# different game states.
+PLOT_CACHE_MAX_ENTRIES = 2 * len(ELEMENTS_CLASSES)
+
+# set_game makes up a digest starting with this for games given without one
+UNIQUE_DIGEST_PREFIX = "loaded-"
+
+# element shown when the page doesn't ask for one
+DEFAULT_ELEMENT_NAME = "Team Rosters"
+
+# "Team 1"/"Team 2" in element names, to be replaced with the team names
+TEAM_NUMBER_PATTERN = re.compile(r"Team ([12])")
+
+# one lock per element, held while checking whether that element needs rebuilding and
+# rebuilding it. Built up front so requests never race to create a lock.
+app._plot_locks = {element_name: threading.Lock() for element_name in ALL_ELEMENT_NAMES}
+# guards app.plot_cache, which all plots share
+app._plot_cache_lock = threading.Lock()
 
 class UpdateWebclientGameStateListener(GameStateListener):
-    def __init__(self, min_refresh_secs, socketio):
+    def __init__(self, socketio):
         logger.debug("UpdateWebclientGameStateListener init")
-        self.last_update_time = datetime.now()
-        self.min_refresh_secs = min_refresh_secs
         self.socketio = socketio
 
     def on_game_state_changed(self) -> None:
-        """Called when the game state changes.
-        Either notify the web client that stage has changed, or, if enough
-        time has passed, tell it to refresh.
+        """Called when the game has been rebuilt from new game state.
+        Push the new game state digest to the web clients. Each client compares it
+        with the digest its page was built from and decides when to refresh, so that
+        the server doesn't re-render anything for clients that are already current.
         """
-        seconds_since_last_update = (datetime.now() - self.last_update_time).total_seconds()
         logger.debug("UpdateWebclientGameStateListener.on_game_state_changed")
         if self.socketio is not None:
-            # test if enough time has passed since last update. This approach could lead to
-            # stun-locking the web client if the game state changes too frequently, except
-            # that the web client will trigger a refresh after self.min_refresh_secs seconds
-            if seconds_since_last_update >= self.min_refresh_secs:
-                # enough time has passed, tell the web client to refresh
-                logger.debug("Emitting refresh")
-                self.socketio.emit("refresh", {})
-            else:
-                # not enough time has passed, just tell the web client that the game state has changed
-                logger.debug("Emitting game_state_changed")
-                self.socketio.emit("game_state_changed", {})
+            logger.debug("Emitting state")
+            self.socketio.emit("state", {"digest": app.game_state_digest})
         else:
             logger.warning("Got game state change, but socketio is None!")
-        self.last_update_time = datetime.now()
 
 
 def start(port: int, scoreboard_client: ScoreboardClient = None,
           scoreboard_server: str = None,
           scoreboard_port: int = None,
-          jamstats_ip: str = None, debug: bool = True, anonymize_names=False,
-          theme="white", min_refresh_secs=GAME_STATE_UPDATE_MINSECS) -> None:
+          jamstats_ip: str = None, debug: bool = False, anonymize_names=False,
+          theme="white", min_refresh_secs=GAME_STATE_UPDATE_MINSECS,
+          warm_cache: bool = True) -> None:
     """
 
     Args:
         port (int): port to start the jamstats server on
         scoreboard_client: scoreboard client to use to get game data
         jamstats_ip (str, optional): IP address to start on. Defaults to None. If None, will infer
-        debug (bool, optional): _description_. Defaults to True.
+        debug (bool, optional): run Flask in debug mode (interactive debugger, extra
+            per-request checks). For development only. Defaults to False.
         scoreboard_server (str, optional): _description_. Defaults to None.
         scoreboard_port (int, optional): _description_. Defaults to None.
         anonymize_names (bool, optional): _description_. Defaults to False.
         theme (str, optional): _description_. Defaults to "white".
+        warm_cache (bool, optional): if a game was set before starting (e.g., from a file),
+            build all its elements in the background so page requests find them ready.
+            Live games aren't warmed: their state changes every few seconds, and most
+            elements of each state are never viewed. Defaults to True.
     """
     matplotlib.use('Agg')
-    app.plotname_image_map = {}
-    app.plotname_time_map = {}
+    # LRU cache of encoded plot images, keyed on (plot name, game state digest)
+    app.plot_cache = OrderedDict()
+    # map from element name to (game state digest, element HTML)
+    app.elementname_html_map = {}
     prepare_to_plot(theme=theme)
+    app.theme = theme
     app.scoreboard_client = scoreboard_client
     app.scoreboard_server = scoreboard_server
     app.scoreboard_port = scoreboard_port
     app.min_refresh_secs = min_refresh_secs
+    app.logo_bytes = get_jamstats_logo_image()
+    app.logo_etag = hashlib.sha256(app.logo_bytes).hexdigest()[:16]
+    app.jamstats_version = get_jamstats_version()
     if jamstats_ip:
+        # no need to look anything up
         app.ip = jamstats_ip
     else:
-        app.ip = socket.gethostbyname(socket.gethostname())
+        try:
+            app.ip = socket.gethostbyname(socket.gethostname())
+        except OSError as e:
+            # misconfigured DNS/hosts. Listen on all interfaces rather than fail to start
+            logger.warning(f"Failed to look up this machine's IP address: {e}. Using 0.0.0.0")
+            app.ip = "0.0.0.0"
     app.port = port
     app.anonymize_names=anonymize_names
 
@@ -193,23 +293,215 @@ def start(port: int, scoreboard_client: ScoreboardClient = None,
     
     logger.debug("Starting SocketIO Flask app...")
 
-    # setting async_mode here seemed to fix a problem where server messages
-    # weren't getting to the client. I don't know why.
-    app.socketio = SocketIO(app, async_mode="gevent") # , logger=True, engineio_logger=True)
+    # Use plain OS threads for everything. The scoreboard client is a blocking
+    # websocket-client loop running in its own thread, so mixing it with gevent
+    # greenlets meant emits from that thread could stall. One model, explicitly.
+    app.socketio = SocketIO(app, async_mode="threading") # , logger=True, engineio_logger=True)
 
-    # add listener to update webclient when game state changes
+    # tells web clients to refresh. Called by the game loader once a new game is ready.
+    app.webclient_listener = UpdateWebclientGameStateListener(app.socketio)
+
+    # rebuild the game in the background when game state changes
     if scoreboard_client is not None:
-        logger.debug("Adding game state listener to scoreboard client")
-        scoreboard_client.add_game_state_listener(UpdateWebclientGameStateListener(app.min_refresh_secs, app.socketio))
+        start_game_loader(scoreboard_client)
+    elif warm_cache and app.derby_game is not None:
+        app.socketio.start_background_task(warm_element_cache)
 
     logger.debug("Flask app started")
-    app.socketio.run(app, host=app.ip, port=port, debug=debug, use_reloader=False)
+    # in threading mode, SocketIO.run already serves each request on its own thread
+    app.socketio.run(app, host=app.ip, port=port, debug=debug, use_reloader=False,
+                     allow_unsafe_werkzeug=True)
     #app.run(host=app.ip, port=port, debug=debug)
 
 
-def set_game(derby_game: DerbyGame):
+def set_game(derby_game: DerbyGame, state_digest: str = None, persist_renders: bool = False):
+    """Set the game to display.
+
+    Args:
+        derby_game (DerbyGame): the game
+        state_digest (str, optional): digest of the game state the game was built from
+            (see compute_game_state_digest). Defaults to None, in which case the game is
+            treated as new content.
+        persist_renders (bool, optional): keep this game's rendered images on disk, for
+            later runs? Only worth it for content that may be loaded again, like a game
+            file. Live scoreboard states never recur. Defaults to False.
+    """
+    now = datetime.now()
     app.derby_game = derby_game
-    app.game_update_time = datetime.now()
+    app.game_update_time = now
+    app.game_state_digest = (state_digest if state_digest is not None
+                             else f"{UNIQUE_DIGEST_PREFIX}{now.timestamp()}")
+    app.game_snapshot = (derby_game, app.game_state_digest)
+    app.persisted_render_digest = (state_digest if persist_renders and state_digest is not None
+                                   else None)
+    # format once here rather than on every page request
+    app.game_update_time_str = now.strftime("%Y-%m-%d, %H:%M:%S")
+    # element display names and the navigation links only depend on the team
+    # names, so build them once per game rather than on every page request
+    if derby_game is not None:
+        teamnumber_name_map = {"1": derby_game.team_1_name, "2": derby_game.team_2_name}
+        app.plotname_displayname_map = {
+            element_name: TEAM_NUMBER_PATTERN.sub(
+                lambda match: teamnumber_name_map[match.group(1)], element_name)
+            for element_name in ELEMENT_NAME_CLASS_MAP.keys()
+        }
+        app.nav_html = build_nav_html(app.plotname_displayname_map)
+        # the elements that can be shown depend only on whether the game has started
+        app.showable_element_names = (ORDERED_ELEMENT_NAMES_TO_SHOW_BEFORE_GAME_START
+                                      if derby_game.game_status == "Prepared"
+                                      else ALL_ELEMENT_NAMES)
+
+
+class GameLoaderListener(GameStateListener):
+    """Signals the background game loader that the scoreboard game state has changed.
+    """
+    def __init__(self):
+        self.game_state_changed = threading.Event()
+
+    def on_game_state_changed(self) -> None:
+        self.game_state_changed.set()
+
+
+def start_game_loader(scoreboard_client: ScoreboardClient) -> None:
+    """Rebuild the derby game in a background task whenever the scoreboard game state
+    changes, so page requests never wait on parsing the game. Web clients are told to
+    refresh once the new game is ready.
+
+    Args:
+        scoreboard_client (ScoreboardClient): client to load game state from
+    """
+    listener = GameLoaderListener()
+    # load whatever the client has already received
+    listener.game_state_changed.set()
+    scoreboard_client.add_game_state_listener(listener)
+    app.socketio.start_background_task(game_loader_loop, scoreboard_client, listener)
+
+
+def game_loader_loop(scoreboard_client: ScoreboardClient, listener: GameLoaderListener) -> None:
+    """Wait for game state changes and rebuild the game. Changes that arrive while a
+    rebuild is running are coalesced into a single further rebuild.
+
+    Args:
+        scoreboard_client (ScoreboardClient): client to load game state from
+        listener (GameLoaderListener): listener signaled by the client
+    """
+    while True:
+        listener.game_state_changed.wait()
+        listener.game_state_changed.clear()
+        if app.scoreboard_client is not scoreboard_client:
+            logger.debug("Scoreboard client replaced. Stopping its game loader.")
+            return
+        try:
+            if update_game_from_scoreboard(scoreboard_client):
+                app.webclient_listener.on_game_state_changed()
+        except Exception as e:
+            logger.warning(f"Failed to update game data from server: {e}")
+            formatted_lines = traceback.format_exc().splitlines()
+            for line in formatted_lines:
+                logger.warning("EXC: " + line)
+
+
+def update_game_from_scoreboard(scoreboard_client: ScoreboardClient) -> bool:
+    """Rebuild the derby game from the scoreboard client's game state, if it has changed
+    since the game was last built.
+
+    Args:
+        scoreboard_client (ScoreboardClient): client to load game state from
+
+    Returns:
+        bool: was the game rebuilt?
+    """
+    if not scoreboard_client.game_state_received_event.is_set():
+        # nothing to load yet. Pages say there's no active game until the first game
+        # state arrives, which signals the loader again.
+        return False
+    with app._derby_game_lock:
+        cur_state_version = scoreboard_client.state_version
+        if (scoreboard_client is app._loaded_state_client
+                and cur_state_version == app._loaded_state_version):
+            return False
+        state_digest = compute_game_state_digest(scoreboard_client.game_json_dict)
+        if state_digest == app.game_state_digest:
+            # e.g., the scoreboard resent the whole state after a reconnect
+            logger.debug(f"Game state version {cur_state_version} has the same content as the "
+                         "loaded game. Not rebuilding.")
+            app._loaded_state_client = scoreboard_client
+            app._loaded_state_version = cur_state_version
+            return False
+        logger.debug(f"Game state version {cur_state_version} != loaded version "
+                     f"{app._loaded_state_version}. Rebuilding game.")
+        try:
+            derby_game = load_json_derby_game(scoreboard_client.game_json_dict)
+        except Exception:
+            app.game_load_error = "Error loading game data from server. Will retry"
+            raise
+        set_game(derby_game, state_digest)
+        app._loaded_state_client = scoreboard_client
+        app._loaded_state_version = cur_state_version
+        app.game_load_error = None
+        return True
+
+
+def compute_game_state_digest(game_json_dict: Dict[str, Any]) -> str:
+    """Compute a digest of a game state that only depends on its content, not on key order.
+
+    Args:
+        game_json_dict (Dict[str, Any]): game JSON
+
+    Returns:
+        str: hex digest
+    """
+    return hashlib.sha256(json_dumps_bytes(game_json_dict, sort_keys=True)).hexdigest()
+
+
+def compute_file_digest(filepath: str) -> str:
+    """Compute a digest of a game file's contents, for set_game.
+
+    Args:
+        filepath (str): path to the file
+
+    Returns:
+        str: hex digest
+    """
+    with open(filepath, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def warm_element_cache() -> None:
+    """Build every element that can currently be shown, so that the first page request
+    for each one doesn't pay to build it. Run once, in the background, by start().
+    """
+    for element_name in app.showable_element_names:
+        element_class = ELEMENT_NAME_CLASS_MAP[element_name]
+        try:
+            if element_class.can_render_html:
+                get_element_html(element_name,
+                                 element_class(anonymize_names=app.anonymize_names))
+            else:
+                build_figure_html(element_name, PLOT_SPECS[element_name])
+        except Exception as e:
+            logger.warning(f"Failed to pre-build {element_name}: {e}")
+
+
+def build_nav_html(plotname_displayname_map: Dict[str, str]) -> str:
+    """Build the HTML for the element navigation links, by section.
+    Links are #fragments. The page switches elements client-side on hashchange.
+
+    Args:
+        plotname_displayname_map (Dict[str, str]): map from element name to display name
+
+    Returns:
+        str: HTML
+    """
+    html_chunks = []
+    for section_name, element_names in SECTION_ELEMENTNAMES_MAP.items():
+        html_chunks.append(f"<b>{escape(section_name)}</b><br/>")
+        for element_name in element_names:
+            display_name = escape(plotname_displayname_map[element_name])
+            html_chunks.append(f"<a href='#{escape(element_name)}'>{display_name}</a>")
+            html_chunks.append("<br/>")
+        html_chunks.append("<br/>")
+    return "\n".join(html_chunks)
 
 
 @app.route("/")
@@ -222,21 +514,18 @@ def index():
             logger.debug("No scoreboard client. Creating one...")
             try:
                 app.scoreboard_client = ScoreboardClient(app.scoreboard_server, app.scoreboard_port)
-                # add listener to update webclient when game state changes
-                logger.debug("Adding game state listener to scoreboard client")
-                app.scoreboard_client.add_game_state_listener(
-                    UpdateWebclientGameStateListener(app.min_refresh_secs, app.socketio))
+                # rebuild the game in the background when game state changes
+                start_game_loader(app.scoreboard_client)
                 logger.debug("Starting scoreboard client thread...")
-                mythread = threading.Thread(target=app.scoreboard_client.start)
-                #mythread.daemon = True
-                mythread.start()
-                logger.debug("Connected to server. Waiting for game data...")
-                time.sleep(2)
-                logger.debug("Done waiting for game data. Checking if connected to server...") 
+                app.socketio.start_background_task(app.scoreboard_client.start)
+                logger.debug("Waiting for game data...")
+                # returns as soon as the first game state arrives
+                app.scoreboard_client.game_state_received_event.wait(
+                    timeout=SCOREBOARD_CONNECT_TIMEOUT_SECS)
+                logger.debug("Done waiting for game data. Checking if connected to server...")
                 if app.scoreboard_client.is_connected_to_server:
                     logger.debug("Connected to server. Loading game data...")
-                    derby_game = load_json_derby_game(app.scoreboard_client.game_json_dict)
-                    set_game(derby_game)
+                    update_game_from_scoreboard(app.scoreboard_client)
                     logger.debug("Updated derby game.")
                 else:
                     app.scoreboard_client = None
@@ -251,94 +540,133 @@ def index():
                 except Exception as e2:
                     logger.warning(f"Exception while printing stack: {e2}")
                 return show_error_page("Exception while connecting to server. Will retry")
-        else:
-            logger.debug("Scoreboard client already exists. Checking for new game data...")
-            if app.scoreboard_client.game_state_dirty:
-                logger.debug("Game state is dirty. Rebuilding game.")
-                # there's new game data. rebuild the game
-                try:
-                    derby_game = load_json_derby_game(app.scoreboard_client.game_json_dict)
-                    app.scoreboard_client.game_state_dirty = False
-                    set_game(derby_game)
-                    logger.debug("Updated game data from server.")
-                except Exception as e:
-                    logger.warning(f"Failed to update game data from server: {e}")
-                    formatted_lines = traceback.format_exc().splitlines()
-                    for line in formatted_lines:
-                        logger.warning("EXC: " + line)
-                    return show_error_page("Error connecting to server. Will retry")
-            else:
-                logger.debug("No new game data. Using existing game data.")
 
-    game_update_time_str = app.game_update_time.strftime("%Y-%m-%d, %H:%M:%S")
+    if app.game_load_error is not None:
+        return show_error_page(app.game_load_error)
 
-    element_name = request.args["plot_name"] if "plot_name" in request.args else "Team Rosters"
+    element_name = request.args.get("plot_name", DEFAULT_ELEMENT_NAME)
+    if element_name not in ELEMENT_NAME_CLASS_MAP:
+        # unknown (or malicious) name. Show the default element instead.
+        element_name = DEFAULT_ELEMENT_NAME
 
     if app.derby_game is not None:
-        plotname_displayname_map = {
-            element_name: (element_name.replace("Team 1", app.derby_game.team_1_name)
-                    .replace("Team 2", app.derby_game.team_2_name))
-            for element_name in ELEMENT_NAME_CLASS_MAP.keys()
-        }
-
-        # define the message to show if we can't display the plot
-        cant_display_message = f"Can't display {plotname_displayname_map[element_name]} right now"
-        # determine which plots we're allowed to show
-        elements_allowed = list(ELEMENT_NAME_CLASS_MAP.keys())
-        if app.derby_game.game_status == "Prepared":
-            # game hasn't started yet. Only show the plots we're supposed to show
-            # before the game starts
-            elements_allowed = ELEMENT_NAMES_TO_SHOW_BEFORE_GAME_START
-            cant_display_message = "Game hasn't started yet."
-
-        element_class = ELEMENT_NAME_CLASS_MAP[element_name]
-        logger.debug(f"About to render class {element_class}")
-        element = element_class(anonymize_names=app.anonymize_names)
-
         can_dl_game_json = app.scoreboard_client is not None and app.scoreboard_client.game_json_dict is not None
 
-
         try:
             return render_template("jamstats_gameplots.html",
-                            jamstats_version=get_jamstats_version(),
-                            game_update_time_str=game_update_time_str,
+                            jamstats_version=app.jamstats_version,
+                            game_update_time_str=app.game_update_time_str,
                             jamstats_ip=app.ip, jamstats_port=app.port,
-                            element=element,
                             element_name=element_name,
-                            section_name_map=SECTION_ELEMENTNAMES_MAP,
-                            plotname_displayname_map=plotname_displayname_map,
-                            element_name_class_map=ELEMENT_NAME_CLASS_MAP,
+                            element_content_html=build_element_content_html(element_name),
+                            nav_html=app.nav_html,
+                            plotname_displayname_map=app.plotname_displayname_map,
                             derby_game=app.derby_game,
                             min_refresh_secs=app.min_refresh_secs,
-                            anonymize_names=app.anonymize_names,
-                            plots_allowed=elements_allowed,
-                            cant_display_message=cant_display_message,
+                            game_state_digest=app.game_state_digest,
                             can_dl_game_json=can_dl_game_json)
         except Exception as e:
             logger.error(f"Exception while rendering template: {e}")
             formatted_lines = traceback.format_exc().splitlines()
             for line in formatted_lines:
                 logger.error("EXC: " + line)
-            return show_error_page(f"Error rendering {element_name}.")
+            return show_error_page(f"Error rendering {escape(element_name)}.")
     else:
         return show_error_page("No active derby game.")
 
 
 
+def get_element_html(element_name: str, element) -> str:
+    """Get the HTML for an HTML element (table, dashboard...).
+    Every client refreshes the page frequently, but the HTML only changes when the
+    game does, so build it only if the game state has changed since it was last built.
+
+    Args:
+        element_name (str): name of the element
+        element: the element object, used to build the HTML if necessary
+
+    Returns:
+        str: HTML for the element
+    """
+    with app._plot_locks[element_name]:
+        state_digest = app.game_state_digest
+        cached = app.elementname_html_map.get(element_name)
+        if cached is not None and cached[0] == state_digest:
+            return cached[1]
+        logger.debug(f"Rebuilding HTML for {element_name}")
+        element_html = element.build_html(app.derby_game)
+        app.elementname_html_map[element_name] = (state_digest, element_html)
+        return element_html
+
+
+def build_element_content_html(element_name: str) -> str:
+    """Build the HTML content for one element: the table HTML, or an image tag for a plot.
+    If the element can't be shown right now (game hasn't started), say so instead.
+
+    Args:
+        element_name (str): name of the element
+
+    Returns:
+        str: HTML
+    """
+    if (app.derby_game.game_status == "Prepared"
+            and element_name not in ELEMENT_NAMES_TO_SHOW_BEFORE_GAME_START):
+        # game hasn't started yet. Only show the elements we're supposed to show
+        # before the game starts
+        return "<p><H2>Game hasn't started yet.</H2></p>"
+    element_class = ELEMENT_NAME_CLASS_MAP[element_name]
+    logger.debug(f"About to render class {element_class}")
+    if element_class.can_render_html:
+        element = element_class(anonymize_names=app.anonymize_names)
+        return "<p>" + get_element_html(element_name, element) + "</p>"
+    return build_figure_html(element_name, PLOT_SPECS[element_name])
+
+
+@app.route("/element/<element_name>")
+def show_element(element_name: str):
+    """Return just the content HTML for one element. The page uses this to switch
+    elements without reloading.
+
+    Args:
+        element_name (str): name of the element
+    """
+    if app.derby_game is None:
+        return show_error_element("No active derby game.")
+    if element_name not in ELEMENT_NAME_CLASS_MAP:
+        return show_error_element(f"Unknown element {escape(element_name)}"), 404
+    try:
+        return build_element_content_html(element_name)
+    except Exception as e:
+        logger.error(f"Exception while rendering element {element_name}: {e}")
+        return show_error_element(f"Error rendering {escape(element_name)}.")
+
+
+@app.route("/updated")
+def updated():
+    """Return the digest of the game state the current game was built from, so that
+    clients that may have missed a pushed state (e.g., while reconnecting) can check
+    whether the page they're showing is out of date.
+    """
+    return app.game_state_digest or ""
+
+
 @app.route("/download_game_json")
 def download_game_json():
     """Download the game JSON.
-
+    Not pretty-printed, which makes the file a fraction of the size.
     """
-    game_json_str = json.dumps(app.scoreboard_client.game_json_dict, indent=4)
-    in_memory_file = io.BytesIO()
-    in_memory_file.write(game_json_str.encode())
-    in_memory_file.seek(0)
-    return send_file(in_memory_file, mimetype='text/json',
-                     as_attachment=True, download_name='derby_game.json')    
+    game_json_bytes = json_dumps_bytes(app.scoreboard_client.game_json_dict)
+    return Response(game_json_bytes, mimetype='text/json',
+                    headers={"Content-Disposition": "attachment; filename=derby_game.json"})
 
 
 def get_error_element_html(error_message: str):
+    """Build the HTML for an error message. The message is included as-is, so any
+    user-supplied text in it must already be escaped.
+
+    Args:
+        error_message (str): error message HTML
+    """
     optional_dl_link_html = ""
     if app.scoreboard_client is not None and app.scoreboard_client.game_json_dict is not None:
         optional_dl_link_html = '''
@@ -363,29 +691,12 @@ def show_error_page(error_message: str):
     Args:
         error_message (str): error message
     """
-    return render_template_string(f'''<!DOCTYPE html>
-    <html>
-        <head title="Jamstats -- error">
-            <script type="text/javascript">
-            setTimeout(function () {{
-                  location.reload();
-                }}, {1000 * 15});
-            </script>
-            <noscript>
-                <meta http-equiv="refresh" content="{15}" />
-            </noscript>
-        </head>
-        <body>
-            <p>
-                <img src="logo" width="200">
-                <br>
-                Jamstats version {get_jamstats_version()}
-            </p>
-            {get_error_element_html(error_message)}
-        </body>
-    </html>
-                '''
-                )
+    # Errors can fire repeatedly (every 15s per client) while the scoreboard is down.
+    # Flask compiles the template once and caches it.
+    return render_template("error.html",
+                           jamstats_version=app.jamstats_version,
+                           error_element_html=get_error_element_html(error_message),
+                           reload_secs=15)
 
 
 def show_error_element(error_message: str):
@@ -394,13 +705,86 @@ def show_error_element(error_message: str):
     Args:
         error_message (str): error message
     """
-    return render_template_string(get_error_element_html(error_message))
+    return get_error_element_html(error_message)
+
+
+def encode_figure(f: Figure, image_format: str) -> bytes:
+    """Encode a figure for serving to the browser.
+
+    Args:
+        f (Figure): figure to encode
+        image_format (str): "jpeg" or "png"
+
+    Returns:
+        bytes: encoded image
+    """
+    fit_figure_dpi(f, MAX_IMAGE_SIZE_PX)
+    if image_format == "jpeg":
+        return encode_figure_jpeg(f)
+    return encode_figure_png(f)
+
+
+def fit_figure_dpi(f: Figure, max_size_px: int) -> None:
+    """Lower a figure's DPI, if needed, so that it renders no larger than max_size_px
+    in either dimension. Only shrinks: smaller figures keep their DPI and display size.
+
+    Args:
+        f (Figure): figure
+        max_size_px (int): maximum width and height, in pixels
+    """
+    max_dpi = max_size_px / max(f.get_figwidth(), f.get_figheight())
+    if f.dpi > max_dpi:
+        f.set_dpi(max_dpi)
+
+
+def encode_figure_png(f: Figure) -> bytes:
+    """Encode a figure as PNG bytes for serving to the browser.
+    Goes straight to the Agg canvas rather than through savefig's format dispatch,
+    and uses fast PNG compression (PNG_PIL_KWARGS).
+
+    Args:
+        f (Figure): figure to encode
+
+    Returns:
+        bytes: PNG bytes
+    """
+    buf = io.BytesIO()
+    FigureCanvasAgg(f).print_png(buf, pil_kwargs=PNG_PIL_KWARGS)
+    return buf.getvalue()
+
+
+def encode_figure_jpeg(f: Figure) -> bytes:
+    """Encode a figure as JPEG bytes for serving to the browser.
+    Draws with Agg and hands Agg's RGBA buffer to Pillow without copying it, skipping
+    matplotlib's print machinery.
+
+    Args:
+        f (Figure): figure to encode
+
+    Returns:
+        bytes: JPEG bytes
+    """
+    canvas = FigureCanvasAgg(f)
+    canvas.draw()
+    rgba = canvas.buffer_rgba()
+    height, width = rgba.shape[:2]
+    image = Image.frombuffer("RGBA", (width, height), rgba, "raw", "RGBA", 0, 1)
+    buf = io.BytesIO()
+    # JPEG has no alpha channel. Plot backgrounds are opaque, so just drop it.
+    image.convert("RGB").save(buf, "JPEG", **JPEG_PIL_KWARGS)
+    return buf.getvalue()
 
 
 @app.route("/logo")
 def show_logo():
-    # add logo to table plots
-    return send_file(io.BytesIO(get_jamstats_logo_image()), mimetype='image/png')
+    # add logo to table plots. The logo never changes while the server is
+    # running, so let the browser cache it rather than refetching it on every refresh.
+    # After a day the browser revalidates, and gets a 304 unless jamstats was upgraded
+    # to a different logo.
+    resp = Response(app.logo_bytes, mimetype='image/png')
+    resp.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    resp.set_etag(app.logo_etag)
+    return resp.make_conditional(request)
 
 
 def generate_figure_html(app, plot_name: str) -> str:
@@ -424,45 +808,144 @@ def generate_figure_html(app, plot_name: str) -> str:
 
 @app.route("/fig/<plot_name>")
 def plot_figure(plot_name: str):
+    """Plot a figure, as an HTML fragment with the plot image. Unknown names get a 404.
+
+    Args:
+        plot_name (str): name of plot to plot
+    """
+    plot_spec = PLOT_SPECS.get(plot_name)
+    if plot_spec is None:
+        logger.error(f"Request for unknown plot {plot_name}")
+        return show_error_element(f"Unknown plot {escape(plot_name)}"), 404
+    return build_figure_html(plot_name, plot_spec)
+
+
+def build_figure_html(plot_name: str, plot_spec: PlotSpec) -> str:
     """Plot a figure.
-    Currently, very inefficient: this method makes the figure again only when necessary,
-    but it *renders* it every time. I'm doing that because earlier I tried saving it to a
-    buffer and reading the buffer every time, but somehow the buffer got closed between
-    calls (multithreading?)
+    The image is served by /plot/<plot_name>?v=<game state digest>; see get_plot_image.
     Args:
         plot_name (str): name of plot to plot
+        plot_spec (PlotSpec): how to build and encode the plot
     """
     logger.debug(f"plot_figure: {plot_name}")
     try:
         if app.derby_game is None:
             return "No derby game set."
+        state_digest, _ = get_plot_image(plot_name, plot_spec)
+        return f'<p><img src="/plot/{plot_name}?v={state_digest}" style="max-width:1000px;max-height:1000px"/>'
+    except Exception as e:
+        logger.error(f"Exception while rendering plot {plot_name}: {e}")
+        return show_error_element(f"Error rendering {escape(plot_name)}: {escape(str(e))}")
 
-        should_rebuild = True
-        if plot_name in app.plotname_time_map:
-            mtime = app.plotname_time_map[plot_name]
-            if mtime >= app.game_update_time:
-                should_rebuild = False
-        if should_rebuild: 
+
+def get_plot_image(plot_name: str, plot_spec: PlotSpec) -> Tuple[str, bytes]:
+    """Get the encoded image of a plot for the current game state.
+    Images are cached on (plot name, game state digest), so a plot is made and encoded
+    at most once per game state, and an unchanged state never re-renders.
+    Args:
+        plot_name (str): name of plot
+        plot_spec (PlotSpec): how to build and encode the plot
+
+    Returns:
+        Tuple[str, bytes]: the game state digest the image was built from, and the image
+    """
+    derby_game, state_digest = app.game_snapshot
+    cache_key = (plot_name, state_digest)
+    # cache hits don't need the plot's lock, so they never wait behind a rebuild
+    image_bytes = get_cached_plot_image(cache_key)
+    if image_bytes is not None:
+        return state_digest, image_bytes
+
+    # Only one request at a time may rebuild a given plot. If several clients ask for
+    # the same plot right after a game update, the first one rebuilds it and the rest
+    # wait and then find it in the cache.
+    with app._plot_locks[plot_name]:
+        image_bytes = get_cached_plot_image(cache_key)
+        if image_bytes is not None:
+            return state_digest, image_bytes
+
+        # if the game was loaded from content that may be loaded again (e.g., a game
+        # file), the image may be on disk from an earlier run
+        render_cache_key = None
+        if state_digest == app.persisted_render_digest:
+            # the team names and colors can be overridden after loading (--anonymizeteams,
+            # --teamcolor1/2), so they're part of the key along with the file's digest
+            render_cache_key = (f"{plot_name}|{state_digest}|{app.anonymize_names}|{app.theme}"
+                                f"|{MAX_IMAGE_SIZE_PX}"
+                                f"|{derby_game.team_1_name}|{derby_game.team_2_name}"
+                                f"|{derby_game.team_color_1}|{derby_game.team_color_2}")
+            image_bytes = read_cached_render(render_cache_key, plot_spec.image_format)
+
+        if image_bytes is None:
             logger.debug(f"Rebuilding {plot_name}")
+            plot_obj = plot_spec.element_class(anonymize_names=app.anonymize_names)
+            f = plot_obj.plot(derby_game)
+            try:
+                image_bytes = encode_figure(f, plot_spec.image_format)
+            finally:
+                # only the encoded bytes are kept. The built-in elements make their figures
+                # without pyplot, so this only matters for one that registers with pyplot.
+                plt.close(f)
+            if render_cache_key is not None:
+                write_cached_render(render_cache_key, plot_spec.image_format, image_bytes)
+
+        with app._plot_cache_lock:
+            app.plot_cache[cache_key] = image_bytes
+            while len(app.plot_cache) > PLOT_CACHE_MAX_ENTRIES:
+                app.plot_cache.popitem(last=False)
+        return state_digest, image_bytes
+
+
+def get_cached_plot_image(cache_key: Tuple[str, str]) -> Optional[bytes]:
+    """Get an encoded plot image from the cache, marking it recently used.
+    Args:
+        cache_key (Tuple[str, str]): plot name and game state digest
+
+    Returns:
+        Optional[bytes]: the image, or None if it isn't cached
+    """
+    with app._plot_cache_lock:
+        image_bytes = app.plot_cache.get(cache_key)
+        if image_bytes is not None:
+            app.plot_cache.move_to_end(cache_key)
+        return image_bytes
 
-            plot_class = ELEMENT_NAME_CLASS_MAP[plot_name]
-            plot_obj = plot_class(anonymize_names=app.anonymize_names)
-            f = plot_obj.plot(app.derby_game)
-            app.plotname_image_map[plot_name] = f
-            app.plotname_time_map[plot_name] = datetime.now() 
-        
-        return f'<p><img src="/plot/{plot_name}" style="max-width:1000px;max-height:1000px"/>'
-    except Exception as e:
-        logger.error(f"Exception while rendering plot {plot_name}: {e}")
-        return show_error_element(f"Error rendering {plot_name}: {e}")
 
 @app.route("/plot/<plot_name>")
 def show_current_plot(plot_name: str):
-    """Render and shw the current plot.
-    It would be much better if we didn't need to render every time.
+    """Show a plot, as cached image bytes (see get_plot_image).
+    Plots are JPEG, tables PNG (see PLOT_SPECS).
+
+    Pages link to /plot/<plot_name>?v=<game state digest>. That URL always means the same
+    image, so while it's cached here it's served as immutable and browsers never ask for
+    it again. A new game state gets a new URL.
+
+    Otherwise (no v, or that version is gone) serve the current plot. The response is
+    conditional: if the browser already has the current version of the plot
+    (If-None-Match matches the game state digest, or If-Modified-Since is no older),
+    answer 304 Not Modified without sending it. Range requests are supported too.
     """
-    f = app.plotname_image_map[plot_name]
-    buf = io.BytesIO()
-    f.savefig(buf, format="png")
-    buf.seek(0)
-    return send_file(buf, mimetype='image/png')
+    plot_spec = PLOT_SPECS.get(plot_name)
+    if plot_spec is None or app.derby_game is None:
+        return Response(status=404)
+    download_name = f"{plot_name}.{plot_spec.image_format}"
+
+    requested_digest = request.args.get("v")
+    if requested_digest:
+        image_bytes = get_cached_plot_image((plot_name, requested_digest))
+        if image_bytes is not None:
+            response = send_file(io.BytesIO(image_bytes),
+                                 mimetype=plot_spec.mimetype,
+                                 download_name=download_name,
+                                 max_age=31536000)
+            response.cache_control.immutable = True
+            return response
+
+    state_digest, image_bytes = get_plot_image(plot_name, plot_spec)
+    return send_file(io.BytesIO(image_bytes),
+                     mimetype=plot_spec.mimetype,
+                     download_name=download_name,
+                     conditional=True,
+                     etag=f"{plot_name}-{state_digest[:16]}",
+                     last_modified=app.game_update_time,
+                     max_age=0)
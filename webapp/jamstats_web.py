@@ -1,36 +1,56 @@
 __author__ = "Damon May"
 
-from flask import (Flask, render_template, request, send_file, render_template_string)
+from flask import (Flask, Response, render_template, request)
 from jamstats.data.game_data import DerbyGame
 from jamstats.plots.plot_util import prepare_to_plot
 from jamstats.util.resources import (
     get_jamstats_logo_image, get_jamstats_version
 )
 from jamstats.io.scoreboard_json_io import load_json_derby_game
+from jamstats.util.render_cache import read_cached_render, write_cached_render
+import hashlib
 import json
 from base64 import b64encode
 from jamstats.plots.plot_together import make_all_plots
 from matplotlib.backends.backend_pdf import PdfPages
 from io import BytesIO
 from flask import make_response
-import inspect
+from concurrent.futures import ThreadPoolExecutor
 from jamstats.plots.plot_together import ELEMENTS_CLASSES
 
 import matplotlib
+from matplotlib import pyplot as plt
+from types import MappingProxyType
 import io
 import logging
+import os
 
 
 logger = logging.Logger(__name__)
 
 app = Flask(__name__.split('.')[0])
 app.jamstats_plots = None
+app.jamstats_version = get_jamstats_version()
+# the logo never changes while the app is running
+app.logo_bytes = get_jamstats_logo_image()
+app.logo_etag = hashlib.sha256(app.logo_bytes).hexdigest()[:16]
 
 #protect against very large file uploads -- 10MB
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
 
 
-ELEMENT_NAME_CLASS_MAP = {element_class.name: element_class for element_class in ELEMENTS_CLASSES}
+# map from element name to element class. Read-only after import, so frozen.
+ELEMENT_NAME_CLASS_MAP = MappingProxyType(
+    {element_class.name: element_class for element_class in ELEMENTS_CLASSES})
+
+# width the results page shows plots at (display_game_plots.html)
+PLOT_DISPLAY_WIDTH_PX = 1000
+# Pillow PNG encoder settings. zlib level 1 encodes several times faster than
+# matplotlib's default, for a slightly larger file.
+PNG_PIL_KWARGS = {"compress_level": 1, "optimize": False}
+
+# threads used to make a game's plots
+PLOT_MAX_WORKERS = min(len(ELEMENTS_CLASSES), os.cpu_count() or 1)
 
 def start(debug: bool = False) -> None:
     """
@@ -51,42 +71,45 @@ def index():
         print("displaying game plots")
         print(request.files)
         try:
-            game_file_contents = request.files['game_file'].read().decode("utf-8", errors="replace") 
+            game_file_bytes = request.files['game_file'].read()
+            game_file_contents = game_file_bytes.decode("utf-8", errors="replace")
+            # identifies the game, so plots rendered for an earlier upload of it can be reused
+            game_file_digest = hashlib.sha256(game_file_bytes).hexdigest()
             game_json = json.loads(game_file_contents)
             app.derby_game = load_json_derby_game(game_json)
         except Exception as e:
             print(e)
-            return render_template_string("""
-                <html>
-                <head><title>Error</title></head>
-                <body>Error loading game file. Please check that the file is a valid JSON file.
-                </body>
-                </html>
-                """)
+            return render_template("load_error.html")
         if request.form.get("mode") == "web":
+            # Elements build their figures without pyplot's global state, so they can be
+            # made and encoded concurrently.
+            with ThreadPoolExecutor(max_workers=PLOT_MAX_WORKERS) as executor:
+                plotname_future_map = {
+                    plot_name: executor.submit(render_element_base64, element_class, app.derby_game,
+                                               game_file_digest)
+                    for plot_name, element_class in ELEMENT_NAME_CLASS_MAP.items()
+                }
             plotname_image_map = {}
-            for plot_name in ELEMENT_NAME_CLASS_MAP.keys():
-                element = ELEMENT_NAME_CLASS_MAP[plot_name]()
+            for plot_name, future in plotname_future_map.items():
                 try:
-                    f = element.plot(app.derby_game)
-                    buf = io.BytesIO()
-                    f.savefig(buf, format="png")
-                    buf.seek(0)
-                    image = b64encode(buf.getvalue()).decode("utf-8")
-                    plotname_image_map[plot_name] = image
+                    plotname_image_map[plot_name] = future.result()
                 except Exception as e:
                     print(f"Error plotting {plot_name}: {e}")
-                    plotname_image_map[plot_name] =  None
+                    plotname_image_map[plot_name] = None
             return render_template("display_game_plots.html",
                                 plotname_image_map=plotname_image_map,
-                                jamstats_version=get_jamstats_version())
+                                jamstats_version=app.jamstats_version)
         else:
             figures = make_all_plots(app.derby_game)
             pdf_bytesio = BytesIO()
             pdfout = PdfPages(pdf_bytesio)
-            for figure in figures:
-                pdfout.savefig(figure)
-            pdfout.close()
+            try:
+                for figure in figures:
+                    pdfout.savefig(figure)
+            finally:
+                pdfout.close()
+                for figure in figures:
+                    plt.close(figure)
             response = make_response(pdf_bytesio.getvalue())
             # name the pdf
             json_filename = request.files['game_file'].filename
@@ -98,10 +121,42 @@ def index():
             return response
     else:
         return render_template("upload_game.html",
-                               jamstats_version=get_jamstats_version())
+                               jamstats_version=app.jamstats_version)
+
+
+def render_element_base64(element_class, derby_game: DerbyGame, game_digest: str) -> str:
+    """Plot an element and render it to PNG, base64-encoded for a data: URL.
+    Rendered PNGs are cached on disk, so the same game uploaded again isn't re-rendered.
+
+    Args:
+        element_class: class of the element to plot
+        derby_game (DerbyGame): game
+        game_digest (str): digest identifying the game's contents
+
+    Returns:
+        str: base64-encoded PNG
+    """
+    render_cache_key = f"webapp|{element_class.name}|{game_digest}|{PLOT_DISPLAY_WIDTH_PX}"
+    png_bytes = read_cached_render(render_cache_key, "png")
+    if png_bytes is None:
+        f = element_class().plot(derby_game)
+        try:
+            # don't render wider figures at more pixels than the page shows
+            dpi = min(f.dpi, PLOT_DISPLAY_WIDTH_PX / f.get_figwidth())
+            buf = io.BytesIO()
+            f.savefig(buf, format="png", dpi=dpi, pil_kwargs=PNG_PIL_KWARGS)
+            png_bytes = buf.getvalue()
+        finally:
+            plt.close(f)
+        write_cached_render(render_cache_key, "png", png_bytes)
+    return b64encode(png_bytes).decode("utf-8")
 
 
 @app.route("/logo")
 def show_logo():
-    # add logo to table plots
-    return send_file(io.BytesIO(get_jamstats_logo_image()), mimetype='image/png')
+    # add logo to table plots. Let the browser cache it, and revalidate with the ETag
+    # after a day in case jamstats was upgraded to a different logo.
+    resp = Response(app.logo_bytes, mimetype='image/png')
+    resp.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    resp.set_etag(app.logo_etag)
+    return resp.make_conditional(request)